@@ -1,9 +1,16 @@
-import os
-
 import uvicorn
 from tomllib import load
 
-from app.server import server
+from app.config.server import (
+    SERVER_BACKLOG,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_HOST,
+    SERVER_HTTP,
+    SERVER_KEEP_ALIVE,
+    SERVER_LOOP,
+    SERVER_PORT,
+    SERVER_WORKERS,
+)
 from app.utils import setup_logger
 
 logger = setup_logger(__name__)
@@ -16,9 +23,26 @@ def get_version():
 
 
 def run_server():
-    """Запуск веб-сервера."""
-    logger.info("Запуск FastAPI сервера")
-    uvicorn.run(server, host="0.0.0.0", port=int(os.getenv("SERVER_PORT")))
+    """Запуск веб-сервера.
+
+    При SERVER_WORKERS > 1 uvicorn запускает несколько процессов, каждый импортирует
+    приложение по строке "app.server:server" и держит свой пул соединений с БД.
+    """
+    logger.info(
+        f"Запуск FastAPI сервера (workers={SERVER_WORKERS}, loop={SERVER_LOOP}, "
+        f"http={SERVER_HTTP})"
+    )
+    uvicorn.run(
+        "app.server:server",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=SERVER_WORKERS,
+        loop=SERVER_LOOP,
+        http=SERVER_HTTP,
+        timeout_keep_alive=SERVER_KEEP_ALIVE,
+        backlog=SERVER_BACKLOG,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+    )
 
 
 if __name__ == "__main__":
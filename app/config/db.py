@@ -3,6 +3,17 @@ import os
 DB_URL = f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}\
 @{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
 
+# Конфигурация полнотекстового поиска Postgres
+SEARCH_LANGUAGE = "russian"
+SEARCH_LIMIT = 20
+
+# Запас по времени для /sync: строки, закоммиченные позже выдачи курсора,
+# но с более ранним updated_at, попадут в следующую синхронизацию
+SYNC_OVERLAP = 5
+
+# Ключ advisory lock Postgres, под которым процессы сервера по очереди инициализируют БД
+DB_INIT_LOCK = 310001
+
 
 class UserLen:
     fullname = 40
@@ -16,3 +27,8 @@ class ObjectLen:
 class WorkerTaskLen:
     note = 100
     description = 100
+
+
+class JobLen:
+    kind = 30
+    error = 200
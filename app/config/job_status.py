@@ -0,0 +1,20 @@
+from enum import IntEnum
+
+
+class JobStatus(IntEnum):
+    """Класс IntEnum статусов фоновой задачи."""
+
+    WAIT = 0
+    COMPLETE = 1
+    CANCELED = 2
+    PROGRESS = 3
+    FAILED = 4
+
+    @property
+    def name(self):
+        """Переопределение property.
+
+        Returns:
+            str: Name in lower case
+        """
+        return super().name.lower()
@@ -0,0 +1,20 @@
+import os
+
+from app.config.server import SERVER_WORKERS
+
+# Число асинхронных воркеров фоновых задач и процессов для CPU-bound работы.
+# JobRunner запускается в каждом процессе сервера, поэтому ядра делятся между ними
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_PROCESSES = int(os.getenv("JOB_PROCESSES", max(1, (os.cpu_count() or 1) // SERVER_WORKERS)))
+
+# Максимум ожидающих задач в очереди, при превышении новые отклоняются
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 100))
+
+# Ключ advisory lock Postgres, сериализующего проверку размера очереди и вставку задачи
+JOB_QUEUE_LOCK = 290001
+
+# Интервалы в секундах: опрос очереди, heartbeat выполняемых задач и таймаут, после
+# которого задача без heartbeat (процесс упал) возвращается в очередь
+JOB_POLL_INTERVAL = 5
+JOB_HEARTBEAT = 10
+JOB_STALE_TIMEOUT = 60
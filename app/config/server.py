@@ -0,0 +1,20 @@
+import os
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8001))
+
+# Production-режим: число процессов, event loop (auto/asyncio/uvloop)
+# и HTTP-парсер (auto/h11/httptools). auto выбирает uvloop/httptools, если они установлены
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 1))
+SERVER_LOOP = os.getenv("SERVER_LOOP", "auto")
+SERVER_HTTP = os.getenv("SERVER_HTTP", "auto")
+
+# Keep-alive соединений и очередь accept() в секундах/соединениях
+SERVER_KEEP_ALIVE = int(os.getenv("SERVER_KEEP_ALIVE", 5))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", 2048))
+
+# Сколько секунд при остановке ждать завершения уже принятых запросов
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+
+# Время жизни ключа приглашения работника в секундах
+INVITE_TIMEOUT = int(os.getenv("TIMER", 30))
@@ -0,0 +1,13 @@
+import os
+
+# Максимальный зум карты и размер сетки кластеризации (GRID x GRID ячеек на тайл)
+TILE_MAX_ZOOM = 20
+TILE_GRID = 8
+
+# Параметры кэша тайлов: число тайлов в памяти и время жизни записи в секундах
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", 4096))
+TILE_CACHE_TTL = int(os.getenv("TILE_CACHE_TTL", 300))
+
+# Окно в секундах, в котором изменения tile_change перечитываются повторно: id выдаётся
+# при вставке, поэтому транзакция с меньшим id может закоммититься позже большего
+TILE_CHANGE_OVERLAP = 5
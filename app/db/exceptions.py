@@ -31,3 +31,12 @@ class AlreadyExistsError(DBError):
     """
 
     pass
+
+
+class QueueFullError(DBError):
+    """Ошибка переполнения очереди фоновых задач.
+    Args:
+        Exception (_type_): DBError
+    """
+
+    pass
@@ -3,18 +3,36 @@ from datetime import datetime
 from sqlalchemy import (
     BigInteger,
     Boolean,
+    Computed,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
     SmallInteger,
     String,
     UniqueConstraint,
+    func,
+    inspect,
+    text,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-
-from app.config.db import DB_URL, ObjectLen, UserLen, WorkerTaskLen
+from sqlalchemy.schema import CreateColumn
+
+from app.config.db import (
+    DB_INIT_LOCK,
+    DB_URL,
+    SEARCH_LANGUAGE,
+    JobLen,
+    ObjectLen,
+    UserLen,
+    WorkerTaskLen,
+)
+from app.config.job_status import JobStatus
 from app.config.roles import Role
 from app.config.task_status import TaskStatus
 
@@ -31,6 +49,22 @@ class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
+def search_vector(weighted: dict[str, str]) -> str:
+    """SQL-выражение взвешенного tsvector для генерируемой колонки поиска.
+
+    Args:
+        weighted (dict[str, str]): Колонки и их веса в формате {"name": "A", "description": "B"}
+
+    Returns:
+        str: Выражение для Computed.
+    """
+    return " || ".join(
+        f"setweight(to_tsvector('{SEARCH_LANGUAGE}'::regconfig, coalesce({column}, '')), "
+        f"'{weight}')"
+        for column, weight in weighted.items()
+    )
+
+
 class User(Base):
 
     __tablename__ = "user"
@@ -40,6 +74,36 @@ class User(Base):
     fullname: Mapped[str] = mapped_column(String(UserLen.fullname), nullable=True)
     reg_time: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, nullable=False)
     role: Mapped[int] = mapped_column(SmallInteger, default=Role.USER, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.now,
+        onupdate=datetime.now,
+        server_default=func.now(),
+        nullable=False,
+        index=True,
+    )
+
+
+class Invite(Base):
+
+    __tablename__ = "invite"
+
+    key: Mapped[int] = mapped_column(Integer, primary_key=True)
+    fullname: Mapped[str] = mapped_column(String(UserLen.fullname), nullable=False)
+    expires: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class TileChange(Base):
+    """Журнал изменённых точек карты для инвалидации кэша тайлов во всех процессах."""
+
+    __tablename__ = "tile_change"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    latitude: Mapped[float] = mapped_column(Float, nullable=False)
+    longitude: Mapped[float] = mapped_column(Float, nullable=False)
+    created: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.now, nullable=False, index=True
+    )
 
 
 class Object(Base):
@@ -52,7 +116,32 @@ class Object(Base):
     description: Mapped[str] = mapped_column(String(ObjectLen.description), nullable=False)
     latitude: Mapped[float] = mapped_column(Float, nullable=False)
     longitude: Mapped[float] = mapped_column(Float, nullable=False)
-    __table_args__ = (UniqueConstraint("name", "description", name="uq_name_description"),)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.now,
+        onupdate=datetime.now,
+        server_default=func.now(),
+        nullable=False,
+        index=True,
+    )
+    search: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(search_vector({"name": "A", "description": "B"}), persisted=True),
+        deferred=True,
+    )
+    __table_args__ = (
+        UniqueConstraint("name", "description", name="uq_name_description"),
+        Index("ix_object_location", "latitude", "longitude"),
+        Index("ix_object_search", "search", postgresql_using="gin"),
+        Index(
+            "ix_object_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
+    # Не забирать search через RETURNING при INSERT, чтобы tsvector не попадал в ответы API
+    __mapper_args__ = {"eager_defaults": False}
 
 
 class WorkerTask(Base):
@@ -68,6 +157,64 @@ class WorkerTask(Base):
     status: Mapped[int] = mapped_column(SmallInteger, default=TaskStatus.WAIT, nullable=False)
     note: Mapped[str] = mapped_column(String(WorkerTaskLen.note), nullable=True)
     completed: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.now,
+        onupdate=datetime.now,
+        server_default=func.now(),
+        nullable=False,
+    )
+    search: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(search_vector({"description": "A", "note": "B"}), persisted=True),
+        deferred=True,
+    )
+    __table_args__ = (
+        Index("ix_worker_object_search", "search", postgresql_using="gin"),
+        Index("ix_worker_object_updated_at", "updated_at"),
+        Index("ix_worker_object_user_id_updated_at", "user_id", "updated_at"),
+    )
+    __mapper_args__ = {"eager_defaults": False}
+
+
+class Job(Base):
+
+    __tablename__ = "job"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
+    kind: Mapped[str] = mapped_column(String(JobLen.kind), nullable=False)
+    params: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[int] = mapped_column(SmallInteger, default=JobStatus.WAIT, nullable=False)
+    result: Mapped[dict] = mapped_column(JSON, nullable=True)
+    error: Mapped[str] = mapped_column(String(JobLen.error), nullable=True)
+    created: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, nullable=False)
+    started: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    finished: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    heartbeat: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    __table_args__ = (Index("ix_job_status_id", "status", "id"),)
+
+
+def upgrade_schema(conn: Connection):
+    """Дополняет уже существующие таблицы колонками и индексами, появившимися в моделях.
+
+    create_all не изменяет существующие таблицы, поэтому новые колонки добавляются через
+    ALTER TABLE (для существующих строк заполняются server_default/Computed), а индексы
+    создаются с проверкой наличия.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} "
+                        f"ADD COLUMN IF NOT EXISTS {CreateColumn(column).compile(conn)}"
+                    )
+                )
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 
 async def db_init():
@@ -78,5 +225,9 @@ async def db_init():
 
     async with engine.connect() as conn:
         logger.info("Инициализация БД")
+        # При нескольких процессах сервера DDL выполняет один, остальные ждут до commit
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DB_INIT_LOCK})
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
         await conn.commit()
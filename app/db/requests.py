@@ -1,19 +1,60 @@
-from datetime import datetime
-from typing import Sequence
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import cast, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config.db import SEARCH_LANGUAGE, SEARCH_LIMIT, SYNC_OVERLAP
+from app.config.job_status import JobStatus
+from app.config.jobs import JOB_QUEUE_LOCK, JOB_QUEUE_SIZE
 from app.config.roles import Role
 from app.config.task_status import TaskStatus
-from app.db.exceptions import AlreadyExistsError, BadFormatError, BadKeyError, DBError
-from app.db.models import Object, User, WorkerTask, async_session
+from app.config.tiles import TILE_CACHE_TTL, TILE_CHANGE_OVERLAP
+from app.db.exceptions import (
+    AlreadyExistsError,
+    BadFormatError,
+    BadKeyError,
+    DBError,
+    QueueFullError,
+)
+from app.db.models import (
+    Invite,
+    Job,
+    Object,
+    TileChange,
+    User,
+    WorkerTask,
+    async_session,
+)
 from app.utils import setup_logger
 
 logger = setup_logger(__name__)
 
 
-async def get_users_by_role(role: Role) -> Sequence[User]:
+@asynccontextmanager
+async def use_session(session: AsyncSession = None) -> AsyncIterator[AsyncSession]:
+    """Переданная сессия или новая, если её нет."""
+    if session is not None:
+        yield session
+    else:
+        async with async_session() as session:
+            yield session
+
+
+@asynccontextmanager
+async def snapshot_session() -> AsyncIterator[AsyncSession]:
+    """Сессия только для чтения, все запросы которой видят один снимок БД."""
+    async with async_session() as session:
+        await session.connection(
+            execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+        )
+        yield session
+
+
+async def get_users_by_role(role: Role, session: AsyncSession = None) -> Sequence[User]:
     """Получение User по Role
 
     Args:
@@ -24,16 +65,16 @@ async def get_users_by_role(role: Role) -> Sequence[User]:
         Sequence[User]: Массив всех найдённых User.
     """
     logger.debug(f"Получение user'ов ро роли (role={role})")
-    async with async_session() as session:
+    async with use_session(session) as session:
         users = await session.scalars(
             select(User).where(User.role.op("&")(role) != 0).order_by(User.fullname)
         )
         return users.all()
 
 
-async def get_user(id: int, use_tg: bool = True) -> User:
+async def get_user(id: int, use_tg: bool = True, session: AsyncSession = None) -> User:
     logger.debug(f"Получение user (id={id}, use_tg={use_tg})")
-    async with async_session() as session:
+    async with use_session(session) as session:
         condition = User.tg_id if use_tg else User.id
         user: User = await session.scalar(select(User).where(condition == id))
 
@@ -100,6 +141,44 @@ async def update_user(id: int, values: dict, use_tg: bool = True) -> None:
             raise BadFormatError(ex)
 
 
+async def set_invite(key: int, fullname: str, timeout: int) -> None:
+    """Сохраняет ключ приглашения работника, заменяя предыдущий.
+
+    Ключ хранится в БД, чтобы его принял любой процесс сервера.
+
+    Args:
+        key (int): Ключ, который работник вводит в /auth.
+        fullname (str): Имя будущего работника.
+        timeout (int): Время жизни ключа в секундах.
+    """
+    logger.debug(f"Установка invite (key={key}, fullname={fullname})")
+    async with async_session() as session:
+        await session.execute(delete(Invite))
+        session.add(
+            Invite(key=key, fullname=fullname, expires=datetime.now() + timedelta(seconds=timeout))
+        )
+        await session.commit()
+
+
+async def pop_invite(key: int) -> Optional[str]:
+    """Погашает действующий ключ приглашения.
+
+    Returns:
+        Optional[str]: Имя работника или None, если ключ неверный или истёк.
+    """
+    logger.debug(f"Погашение invite (key={key})")
+    if not 0 <= key < 2**31:
+        return None
+    async with async_session() as session:
+        fullname = await session.scalar(
+            delete(Invite)
+            .where(Invite.key == key, Invite.expires > datetime.now())
+            .returning(Invite.fullname)
+        )
+        await session.commit()
+        return fullname
+
+
 async def set_factory(name: str, description: str, lat: float, lon: float) -> Object:
     """Устанавливет или обновляет завод.
 
@@ -122,6 +201,7 @@ async def set_factory(name: str, description: str, lat: float, lon: float) -> Ob
         )
         session.add(factory)
         try:
+            await add_tile_change(session, lat, lon)
             await session.commit()
         except IntegrityError:
             raise AlreadyExistsError()
@@ -130,9 +210,9 @@ async def set_factory(name: str, description: str, lat: float, lon: float) -> Ob
         return factory
 
 
-async def get_factory(id: int) -> Object:
+async def get_factory(id: int, session: AsyncSession = None) -> Object:
     logger.debug(f"Получение factory (id={id})")
-    async with async_session() as session:
+    async with use_session(session) as session:
         factory: Object = await session.scalar(select(Object).where(Object.id == id))
 
         if not factory:
@@ -148,16 +228,96 @@ async def delete_factory(id: int) -> None:
         if not factory:
             raise BadKeyError()
         factory.is_deleted = True
+        await add_tile_change(session, factory.latitude, factory.longitude)
         await session.commit()
 
 
-async def get_factories(deleted: bool = False) -> Sequence[Object]:
+async def get_factories(deleted: bool = False, session: AsyncSession = None) -> Sequence[Object]:
     logger.debug(f"Получение factories (deleted={deleted})")
-    async with async_session() as session:
+    async with use_session(session) as session:
         factories = await session.scalars(select(Object).where(Object.is_deleted.is_(deleted)))
         return factories.all()
 
 
+async def add_tile_change(session: AsyncSession, lat: float, lon: float) -> None:
+    """Записывает изменение точки карты в транзакции изменения завода.
+
+    Записи старше двух TILE_CACHE_TTL удаляются: закэшированные до них тайлы
+    к этому моменту уже истекли в любом процессе.
+    """
+    await session.execute(
+        delete(TileChange).where(
+            TileChange.created < datetime.now() - timedelta(seconds=2 * TILE_CACHE_TTL)
+        )
+    )
+    session.add(TileChange(latitude=lat, longitude=lon))
+
+
+async def get_tile_changes(after_id: Optional[int]) -> tuple[int, list[tuple[int, float, float]]]:
+    """Изменения точек карты после after_id и за последние TILE_CHANGE_OVERLAP секунд.
+
+    Окно нужно потому, что изменение с меньшим id может закоммититься позже большего,
+    уже учтённые в окне изменения отбрасывает TileCache.sync.
+
+    Args:
+        after_id (Optional[int]): Последнее учтённое изменение, None - процесс только
+                                  запущен и его кэш пуст.
+
+    Returns:
+        tuple[int, list[tuple[int, float, float]]]: Последний id и изменения (id, lat, lon).
+    """
+    async with async_session() as session:
+        window = TileChange.created > datetime.now() - timedelta(seconds=TILE_CHANGE_OVERLAP)
+        if after_id is None:
+            after_id = await session.scalar(select(func.coalesce(func.max(TileChange.id), 0)))
+            condition = window
+        else:
+            condition = or_(TileChange.id > after_id, window)
+        changes = await session.execute(
+            select(TileChange.id, TileChange.latitude, TileChange.longitude)
+            .where(condition)
+            .order_by(TileChange.id)
+        )
+        changes = changes.all()
+        return max([after_id, *(id for id, _, _ in changes)]), changes
+
+
+async def get_factory_clusters(
+    west: float, south: float, east: float, north: float, grid: int
+) -> list[dict]:
+    """Кластеризация заводов внутри прямоугольника по сетке grid x grid.
+
+    Returns:
+        list[dict]: Кластеры {"count", "latitude", "longitude"} с центроидом,
+                    для одиночного завода также "id".
+    """
+    logger.debug(f"Кластеризация factories в ({west}, {south}, {east}, {north}), grid={grid}")
+    cell_x = func.least(func.floor((Object.longitude - west) * grid / (east - west)), grid - 1)
+    cell_y = func.least(func.floor((Object.latitude - south) * grid / (north - south)), grid - 1)
+    async with async_session() as session:
+        rows = await session.execute(
+            select(
+                func.count(Object.id),
+                func.avg(Object.latitude),
+                func.avg(Object.longitude),
+                func.min(Object.id),
+            )
+            .where(
+                Object.is_deleted.is_(False),
+                Object.latitude.between(south, north),
+                Object.longitude.between(west, east),
+            )
+            .group_by(cell_x, cell_y)
+        )
+        clusters = []
+        for count, lat, lon, id in rows:
+            cluster = {"count": count, "latitude": lat, "longitude": lon}
+            if count == 1:
+                cluster["id"] = id
+            clusters.append(cluster)
+        return clusters
+
+
 async def add_task(admin_id: int, user_id: int, object_id: int, description: str) -> WorkerTask:
     logger.debug("add_task to db")
     async with async_session() as session:
@@ -190,9 +350,9 @@ async def update_task(task_id: int, status: TaskStatus, note: str = "") -> Worke
         return task
 
 
-async def get_task(task_id: int) -> WorkerTask:
+async def get_task(task_id: int, session: AsyncSession = None) -> WorkerTask:
     logger.debug("get_task to db")
-    async with async_session() as session:
+    async with use_session(session) as session:
         task: WorkerTask = await session.scalar(select(WorkerTask).where(WorkerTask.id == task_id))
 
         if not task:
@@ -200,9 +360,11 @@ async def get_task(task_id: int) -> WorkerTask:
         return task
 
 
-async def get_tasks(user_id: int, status: TaskStatus) -> Sequence[WorkerTask]:
+async def get_tasks(
+    user_id: int, status: TaskStatus, session: AsyncSession = None
+) -> Sequence[WorkerTask]:
     logger.debug("get_tasks from db")
-    async with async_session() as session:
+    async with use_session(session) as session:
         if user_id == -1:
             if status != TaskStatus.ALL:
                 tasks = await session.scalars(
@@ -223,3 +385,232 @@ async def get_tasks(user_id: int, status: TaskStatus) -> Sequence[WorkerTask]:
                 )
 
         return tasks.all()
+
+
+async def search(query: str, user_id: int, limit: int = SEARCH_LIMIT) -> dict[str, Sequence]:
+    """Полнотекстовый поиск по объектам и задачам с ранжированием.
+
+    Объекты ищутся по tsvector от name/description и нечётко по name (pg_trgm),
+    задачи - по tsvector от description/note.
+
+    Args:
+        query (str): Поисковый запрос в формате websearch (слова, "фразы", -исключения).
+        user_id (int): Ограничение задач по исполнителю, -1 - задачи всех пользователей.
+        limit (int, optional): Максимум результатов каждого типа. Defaults to SEARCH_LIMIT.
+
+    Returns:
+        dict[str, Sequence]: {"objects": [...], "tasks": [...]} по убыванию релевантности.
+    """
+    logger.debug(f"Поиск (query={query}, user_id={user_id}, limit={limit})")
+    ts_query = func.websearch_to_tsquery(cast(SEARCH_LANGUAGE, REGCONFIG), query)
+    async with async_session() as session:
+        objects = await session.scalars(
+            select(Object)
+            .where(
+                Object.is_deleted.is_(False),
+                or_(Object.search.op("@@")(ts_query), Object.name.op("%")(query)),
+            )
+            .order_by(
+                func.greatest(
+                    func.ts_rank(Object.search, ts_query), func.similarity(Object.name, query)
+                ).desc()
+            )
+            .limit(limit)
+        )
+
+        condition = WorkerTask.search.op("@@")(ts_query)
+        if user_id != -1:
+            condition = condition & (WorkerTask.user_id == user_id)
+        tasks = await session.scalars(
+            select(WorkerTask)
+            .where(condition)
+            .order_by(func.ts_rank(WorkerTask.search, ts_query).desc())
+            .limit(limit)
+        )
+
+        return {"objects": objects.all(), "tasks": tasks.all()}
+
+
+async def get_changes(since: Optional[datetime], user_id: int, with_users: bool) -> dict:
+    """Изменения User, Object и WorkerTask с момента курсора для дельта-синхронизации.
+
+    Удалённые объекты (is_deleted) и пониженные до Role.USER пользователи отдаются
+    как tombstones, чтобы клиент убрал их у себя. Без курсора отдаётся полный снимок
+    без tombstones.
+
+    Args:
+        since (Optional[datetime]): Курсор из прошлой синхронизации, None - полная выгрузка.
+        user_id (int): Ограничение задач по исполнителю, -1 - задачи всех пользователей.
+        with_users (bool): Включать ли пользователей в ответ.
+
+    Returns:
+        dict: {"cursor": datetime, "users": [...], "objects": [...], "tasks": [...]}
+    """
+    logger.debug(f"Получение изменений (since={since}, user_id={user_id})")
+    cursor = datetime.now()
+    async with async_session() as session:
+        if since is None:
+            users_query = select(User).where(User.role.op("&")(Role.WORKER) != 0)
+            objects_query = select(Object).where(Object.is_deleted.is_(False))
+            tasks_query = select(WorkerTask)
+        else:
+            if since.tzinfo is not None:
+                since = since.astimezone().replace(tzinfo=None)
+            since -= timedelta(seconds=SYNC_OVERLAP)
+            users_query = select(User).where(
+                User.updated_at > since, User.role.op("&")(Role.WORKER | Role.USER) != 0
+            )
+            objects_query = select(Object).where(Object.updated_at > since)
+            tasks_query = select(WorkerTask).where(WorkerTask.updated_at > since)
+        if user_id != -1:
+            tasks_query = tasks_query.where(WorkerTask.user_id == user_id)
+
+        users = (await session.scalars(users_query)).all() if with_users else []
+        objects = await session.scalars(objects_query)
+        tasks = await session.scalars(tasks_query)
+
+        return {"cursor": cursor, "users": users, "objects": objects.all(), "tasks": tasks.all()}
+
+
+async def add_job(user_id: int, kind: str, params: dict) -> Job:
+    """Ставит фоновую задачу в очередь.
+
+    Raises:
+        QueueFullError: В очереди уже JOB_QUEUE_SIZE ожидающих задач.
+    """
+    logger.debug(f"Добавление job (user_id={user_id}, kind={kind})")
+    async with async_session() as session:
+        # Блокировка до конца транзакции: параллельные submit из разных процессов
+        # не пройдут проверку размера очереди одновременно
+        await session.execute(select(func.pg_advisory_xact_lock(JOB_QUEUE_LOCK)))
+        waiting = await session.scalar(
+            select(func.count(Job.id)).where(Job.status == JobStatus.WAIT)
+        )
+        if waiting >= JOB_QUEUE_SIZE:
+            raise QueueFullError()
+
+        job = Job(user_id=user_id, kind=kind, params=params)
+        session.add(job)
+        try:
+            await session.commit()
+        except Exception as ex:
+            raise DBError(ex)
+        return job
+
+
+async def get_job(job_id: int) -> Job:
+    logger.debug(f"Получение job (id={job_id})")
+    async with async_session() as session:
+        job: Job = await session.scalar(select(Job).where(Job.id == job_id))
+
+        if not job:
+            raise BadKeyError()
+        return job
+
+
+async def claim_job() -> Optional[Job]:
+    """Атомарно забирает самую старую ожидающую задачу и переводит её в PROGRESS.
+
+    FOR UPDATE SKIP LOCKED позволяет нескольким воркерам и процессам разбирать
+    очередь параллельно, не получая одну задачу дважды.
+
+    Returns:
+        Optional[Job]: Захваченная задача или None, если очередь пуста.
+    """
+    async with async_session() as session:
+        job_id = (
+            select(Job.id)
+            .where(Job.status == JobStatus.WAIT)
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        now = datetime.now()
+        job: Job = await session.scalar(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status=JobStatus.PROGRESS, started=now, heartbeat=now)
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if job:
+            logger.debug(f"Захват job (id={job.id}, kind={job.kind})")
+        return job
+
+
+async def finish_job(
+    job_id: int, status: JobStatus, result: dict = None, error: str = None
+) -> None:
+    """Завершает выполняемую задачу. Отменённую за время работы задачу не перезаписывает.
+
+    При status == JobStatus.WAIT задача возвращается в очередь.
+    """
+    logger.debug(f"Завершение job (id={job_id}, status={status.name})")
+    values = {"status": status, "result": result, "error": error}
+    if status == JobStatus.WAIT:
+        values |= {"started": None, "heartbeat": None}
+    else:
+        values |= {"finished": datetime.now()}
+    async with async_session() as session:
+        await session.execute(
+            update(Job).where(Job.id == job_id, Job.status == JobStatus.PROGRESS).values(values)
+        )
+        await session.commit()
+
+
+async def cancel_job(job_id: int) -> Job:
+    """Отменяет ожидающую или выполняемую задачу, завершённую возвращает как есть."""
+    logger.debug(f"Отмена job (id={job_id})")
+    async with async_session() as session:
+        job: Job = await session.scalar(select(Job).where(Job.id == job_id).with_for_update())
+
+        if not job:
+            raise BadKeyError()
+        if job.status in (JobStatus.WAIT, JobStatus.PROGRESS):
+            job.status = JobStatus.CANCELED
+            job.finished = datetime.now()
+            await session.commit()
+        return job
+
+
+async def touch_jobs(job_ids: Sequence[int]) -> set[int]:
+    """Обновляет heartbeat выполняемых задач.
+
+    Returns:
+        set[int]: id задач, всё ещё находящихся в PROGRESS (остальные были отменены).
+    """
+    if not job_ids:
+        return set()
+    async with async_session() as session:
+        alive = await session.scalars(
+            update(Job)
+            .where(Job.id.in_(job_ids), Job.status == JobStatus.PROGRESS)
+            .values(heartbeat=datetime.now())
+            .returning(Job.id)
+        )
+        alive = set(alive.all())
+        await session.commit()
+        return alive
+
+
+async def requeue_stale_jobs(timeout: int) -> int:
+    """Возвращает в очередь задачи, чей heartbeat не обновлялся timeout секунд.
+
+    Returns:
+        int: Число возвращённых задач.
+    """
+    async with async_session() as session:
+        stale = await session.execute(
+            update(Job)
+            .where(
+                Job.status == JobStatus.PROGRESS,
+                Job.heartbeat < datetime.now() - timedelta(seconds=timeout),
+            )
+            .values(status=JobStatus.WAIT, started=None, heartbeat=None)
+        )
+        await session.commit()
+        if stale.rowcount:
+            logger.info(f"Возвращено в очередь зависших job: {stale.rowcount}")
+        return stale.rowcount
@@ -1,87 +1,73 @@
-import asyncio
-import os
 import threading
+import time
+from collections import OrderedDict
 
-from app.utils import setup_logger
+from app.config.tiles import TILE_CACHE_SIZE, TILE_CACHE_TTL
+from app.utils import point_tiles, setup_logger
 
 logger = setup_logger(__name__)
 
 
-class ThreadSafeKey:
-    _key = None
-    _name = None
-    _lock = threading.Lock()
+class TileCache:
+    """LRU-кэш кластеров по тайлам карты с временем жизни записей.
+
+    Кэш свой в каждом процессе сервера, поэтому инвалидация идёт через журнал
+    tile_change в БД: перед чтением кэша процесс применяет новые записи через sync.
+    """
+
+    _tiles = OrderedDict()
+    _version = 0
+    _last_change = None
+    _applied: set[int] = set()
+    _lock = threading.RLock()
 
     @classmethod
-    def add(cls, data: tuple):
-        """Добавляет элемент в множество."""
+    def get(cls, key: tuple) -> tuple[list | None, int]:
+        """Возвращает кластеры тайла (или None) и версию кэша для последующего put."""
         with cls._lock:
-            logger.debug(f"Set key = {data}")
-            cls._key = data[0]
-            cls._name = data[1]
+            entry = cls._tiles.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                cls._tiles.pop(key, None)
+                return None, cls._version
+            cls._tiles.move_to_end(key)
+            return entry[1], cls._version
 
     @classmethod
-    def is_valid(cls, key: int):
-        """Проверяет, содержится ли элемент в множестве."""
+    def put(cls, key: tuple, clusters: list, version: int):
+        """Сохраняет тайл, если с момента get не было инвалидаций."""
         with cls._lock:
-            logger.debug(f"is_valid (our == your): {cls._key} == {key} ?")
-            if key == cls._key:
-                return cls._name
-            return None
+            if version != cls._version:
+                return
+            cls._tiles[key] = (time.monotonic() + TILE_CACHE_TTL, clusters)
+            cls._tiles.move_to_end(key)
+            while len(cls._tiles) > TILE_CACHE_SIZE:
+                cls._tiles.popitem(last=False)
 
     @classmethod
-    def clear(cls):
-        """Удаляет элемент из множества, если он есть."""
+    def last_change(cls) -> int | None:
+        """id последнего применённого изменения из tile_change."""
         with cls._lock:
-            logger.debug(f"Clear key = {cls._key}")
-            cls._key = None
-
-
-class TimerSingleton:
-    _instance = None
-    _task = None
-    _event = asyncio.Event()
-    _lock = asyncio.Lock()
-    timeout = int(os.getenv("TIMER", 30))
-    message_id = None
-    chat_id = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(TimerSingleton, cls).__new__(cls)
-        return cls._instance
+            return cls._last_change
 
-    async def _start_timer(self):
-        """Таймер с задержкой в n секунд"""
-        logger.debug(f"Таймер начался, ожидаем {self.timeout} секунд...")
-        try:
-            await asyncio.wait_for(self._event.wait(), timeout=self.timeout)
-        except TimeoutError:
-            logger.debug("Таймер завершился.")
-        except asyncio.CancelledError:
-            logger.debug("Таймер был остановлен вручную.")
-        finally:
-            ThreadSafeKey.clear()
-            self._task = None
-            self._event.clear()
+    @classmethod
+    def sync(cls, last_change: int, changes: list[tuple[int, float, float]]):
+        """Применяет изменения (id, lat, lon) из tile_change, полученные после last_change().
 
-    async def start(self, data: tuple):
-        """Запускает таймер и сохраняет ID сообщения"""
-        async with self._lock:
-            if self._task is not None and not self._task.done():
-                self._task.cancel()
-                try:
-                    await self._task
-                except asyncio.CancelledError:
-                    print("Предыдущий таймер был отменен.")
-            ThreadSafeKey.add(data)
-            self._event.clear()
-            self._task = asyncio.create_task(self._start_timer())
+        Изменения из окна перекрытия приходят повторно, поэтому уже применённые
+        в прошлый раз пропускаются.
+        """
+        with cls._lock:
+            for id, lat, lon in changes:
+                if id not in cls._applied:
+                    cls.invalidate(lat, lon)
+            cls._applied = {id for id, _, _ in changes}
+            cls._last_change = max(cls._last_change or 0, last_change)
 
-    async def stop(self, name=None):
-        """Останавливает таймер до истечения времени"""
-        logger.debug(f"Stop timer ({name})")
-        async with self._lock:
-            if self._task is not None:
-                self._task.cancel()
-                self._event.set()
+    @classmethod
+    def invalidate(cls, lat: float, lon: float):
+        """Удаляет из кэша тайлы всех зумов, содержащие точку."""
+        with cls._lock:
+            logger.debug(f"Invalidate tiles at ({lat}, {lon})")
+            cls._version += 1
+            for key in point_tiles(lat, lon):
+                cls._tiles.pop(key, None)
@@ -0,0 +1,215 @@
+import asyncio
+import csv
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable
+
+from app.config.db import JobLen
+from app.config.job_status import JobStatus
+from app.config.jobs import (
+    JOB_HEARTBEAT,
+    JOB_POLL_INTERVAL,
+    JOB_PROCESSES,
+    JOB_STALE_TIMEOUT,
+    JOB_WORKERS,
+)
+from app.config.task_status import TaskStatus
+from app.db.exceptions import BadFormatError
+from app.db.models import Job
+from app.db.requests import (
+    add_job,
+    cancel_job,
+    claim_job,
+    finish_job,
+    get_factories,
+    get_tasks,
+    requeue_stale_jobs,
+    touch_jobs,
+)
+from app.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def render_csv(header: list, rows: list) -> str:
+    """CPU-bound формирование CSV, выполняется в процессе пула."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+async def export_tasks(runner: "JobRunner", params: dict) -> dict:
+    """Выгрузка задач в CSV. params: user_id (-1 - все), status (TaskStatus)."""
+    tasks = await get_tasks(params.get("user_id", -1), params.get("status", TaskStatus.ALL))
+    rows = [
+        (
+            task.id,
+            task.user_id,
+            task.object_id,
+            TaskStatus(task.status).name,
+            task.description,
+            task.note or "",
+            task.created.isoformat(),
+            task.completed.isoformat() if task.completed else "",
+        )
+        for task in tasks
+    ]
+    header = [
+        "id",
+        "user_id",
+        "object_id",
+        "status",
+        "description",
+        "note",
+        "created",
+        "completed",
+    ]
+    return {"csv": await runner.run_cpu(render_csv, header, rows)}
+
+
+async def export_objects(runner: "JobRunner", params: dict) -> dict:
+    """Выгрузка заводов в CSV. params: deleted (bool)."""
+    factories = await get_factories(params.get("deleted", False))
+    rows = [(f.id, f.name, f.description, f.latitude, f.longitude) for f in factories]
+    header = ["id", "name", "description", "latitude", "longitude"]
+    return {"csv": await runner.run_cpu(render_csv, header, rows)}
+
+
+# Обработчики фоновых задач по kind. I/O выполняется в корутине обработчика,
+# CPU-bound часть передаётся в пул процессов через JobRunner.run_cpu
+JOBS: dict[str, Callable[["JobRunner", dict], Awaitable[dict]]] = {
+    "export_tasks": export_tasks,
+    "export_objects": export_objects,
+}
+
+
+class JobRunner:
+    """Исполнитель фоновых задач из таблицы job.
+
+    Очередь хранится в Postgres: задачи переживают перезапуск, а несколько процессов
+    сервера разбирают её без дублей. Выполняемые задачи периодически обновляют heartbeat,
+    задачи упавших процессов по таймауту возвращаются в очередь.
+    """
+
+    _instance = None
+    _pool = None
+    _wakeup = None
+    _tasks: list[asyncio.Task] = []
+    _running: dict[int, asyncio.Task] = {}
+    _canceled: set[int] = set()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobRunner, cls).__new__(cls)
+        return cls._instance
+
+    async def start(self):
+        """Запускает пул процессов, воркеры и heartbeat."""
+        logger.info(f"Запуск JobRunner (workers={JOB_WORKERS}, processes={JOB_PROCESSES})")
+        self._pool = ProcessPoolExecutor(
+            JOB_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(JOB_WORKERS)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        """Останавливает воркеры, прерванные задачи возвращаются в очередь."""
+        logger.info("Остановка JobRunner")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def submit(self, user_id: int, kind: str, params: dict) -> Job:
+        """Ставит задачу в очередь и будит воркеры.
+
+        Raises:
+            BadFormatError: Неизвестный kind.
+            QueueFullError: Очередь переполнена.
+        """
+        if kind not in JOBS:
+            raise BadFormatError(f"Unknown job kind: {kind}")
+        job = await add_job(user_id, kind, params)
+        self._wakeup.set()
+        return job
+
+    async def cancel(self, job_id: int) -> Job:
+        """Отменяет задачу. Выполняемая в этом процессе задача прерывается сразу,
+        в других процессах - на ближайшем heartbeat. Уже запущенная в пуле
+        CPU-bound функция доработает, но её результат будет отброшен."""
+        job = await cancel_job(job_id)
+        self._interrupt(job_id)
+        return job
+
+    async def run_cpu(self, func: Callable, *args):
+        """Выполняет CPU-bound функцию в пуле процессов, не блокируя event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    def _interrupt(self, job_id: int):
+        if task := self._running.get(job_id):
+            self._canceled.add(job_id)
+            task.cancel()
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await claim_job()
+            except Exception as ex:
+                logger.error(f"Ошибка получения job: {ex}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            task = asyncio.create_task(self._run(job))
+            self._running[job.id] = task
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                await asyncio.wait({task})
+                raise
+            finally:
+                self._running.pop(job.id, None)
+                self._canceled.discard(job.id)
+
+    async def _run(self, job: Job):
+        logger.debug(f"Выполнение job (id={job.id}, kind={job.kind})")
+        try:
+            result = await JOBS[job.kind](self, job.params)
+        except asyncio.CancelledError:
+            if job.id in self._canceled:
+                logger.debug(f"Job (id={job.id}) отменена")
+            else:
+                logger.info(f"Job (id={job.id}) прервана остановкой, возврат в очередь")
+                await finish_job(job.id, JobStatus.WAIT)
+            return
+        except Exception as ex:
+            logger.error(f"Job (id={job.id}) завершилась ошибкой: {ex}")
+            await finish_job(job.id, JobStatus.FAILED, error=str(ex)[: JobLen.error])
+            return
+        await finish_job(job.id, JobStatus.COMPLETE, result)
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                alive = await touch_jobs(list(self._running))
+                for job_id in set(self._running) - alive:
+                    self._interrupt(job_id)
+                if await requeue_stale_jobs(JOB_STALE_TIMEOUT):
+                    self._wakeup.set()
+            except Exception as ex:
+                logger.error(f"Ошибка heartbeat job: {ex}")
+            await asyncio.sleep(JOB_HEARTBEAT)
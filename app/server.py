@@ -2,36 +2,53 @@ import asyncio
 import random
 import secrets
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Path
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config.db import SEARCH_LIMIT
 from app.config.roles import Role
+from app.config.server import INVITE_TIMEOUT
 from app.config.task_status import TaskStatus
-from app.db.models import User, db_init
+from app.config.tiles import TILE_GRID, TILE_MAX_ZOOM
+from app.db.exceptions import BadFormatError, BadKeyError, QueueFullError
+from app.db.models import User, db_init, engine
 from app.db.requests import (
     add_task,
     delete_factory,
+    get_changes,
     get_factories,
     get_factory,
+    get_factory_clusters,
+    get_job,
     get_task,
     get_tasks,
+    get_tile_changes,
     get_user,
     get_users_by_role,
+    pop_invite,
+    search,
     set_factory,
+    set_invite,
     set_user,
+    snapshot_session,
     update_task,
     update_user,
 )
-from app.instances import ThreadSafeKey, TimerSingleton
-from app.utils import setup_logger
+from app.instances import TileCache
+from app.jobs import JobRunner
+from app.utils import setup_logger, tile_bounds
 
 
 async def lifespan(app: FastAPI):
     await db_init()
+    await JobRunner().start()
     yield
+    await JobRunner().stop()
+    await engine.dispose()
 
 
 server = FastAPI(lifespan=lifespan)
@@ -73,6 +90,30 @@ class GetTask(BaseModel):
     status: int
 
 
+class BatchOperation(BaseModel):
+    op: Literal["users", "user", "objects", "object", "tasks", "task"]
+    id: int = -1
+    user_id: int = -1
+    status: int = TaskStatus.ALL
+
+
+class Batch(BaseModel):
+    token: int
+    operations: list[BatchOperation] = Field(min_length=1, max_length=20)
+
+
+class CreateJob(BaseModel):
+    token: int
+    kind: str
+    params: dict = {}
+
+
+class Search(BaseModel):
+    token: int
+    query: str = Field(min_length=1)
+    limit: int = Field(SEARCH_LIMIT, ge=1, le=100)
+
+
 class Object(BaseModel):
     name: str
     latitude: float
@@ -103,7 +144,7 @@ async def authenticate(request: AuthRequest):
         await update_user(token, {User.role: Role.OWNER})
         return await get_user(token)
 
-    if name := ThreadSafeKey.is_valid(request.key):
+    if name := await pop_invite(request.key):
         user = await set_user()
         token = secrets.randbits(63)
         await update_user(
@@ -111,7 +152,6 @@ async def authenticate(request: AuthRequest):
             {User.tg_id: token, User.fullname: name, User.role: Role.WORKER},
             False,
         )
-        await TimerSingleton().stop(name)
         return {"token": token}
     else:
         logger.debug("Key is wrong")
@@ -125,8 +165,7 @@ async def create_user(request: CreateWorker):
         if user.role != Role.OWNER:
             raise Exception("User is not OWNER")
         key = random.randint(100000, 999999)
-        timer = TimerSingleton()
-        await timer.start((key, request.fullname))
+        await set_invite(key, request.fullname, INVITE_TIMEOUT)
         return {"key": key}
     except Exception as e:
         logger.debug(f"Token is wrong: {e}")
@@ -198,6 +237,31 @@ async def list_objects(request: GetSmth):
         raise HTTPException(status_code=401, detail="Token is invalid")
 
 
+@server.post("/objects/tiles/{z}/{x}/{y}")
+async def list_object_tile(
+    request: GetSmth,
+    z: int = Path(ge=0, le=TILE_MAX_ZOOM),
+    x: int = Path(ge=0),
+    y: int = Path(ge=0),
+):
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    try:
+        user = await get_user(request.token)
+        if user.role == Role.USER:
+            raise Exception("User has role USER")
+    except Exception as e:
+        logger.debug(f"Token is wrong: {e}")
+        raise HTTPException(status_code=401, detail="Token is invalid")
+
+    TileCache.sync(*await get_tile_changes(TileCache.last_change()))
+    clusters, version = TileCache.get((z, x, y))
+    if clusters is None:
+        clusters = await get_factory_clusters(*tile_bounds(z, x, y), TILE_GRID)
+        TileCache.put((z, x, y), clusters, version)
+    return clusters
+
+
 @server.post("/object/get/{object_id}")
 async def list_object(request: GetSmth, object_id: int):
     try:
@@ -272,3 +336,142 @@ async def del_task(request: UpdateTask):
     except Exception as e:
         logger.debug(f"Token is wrong: {e}")
         raise HTTPException(status_code=401, detail="Token is invalid")
+
+
+@server.post("/search")
+async def search_all(request: Search):
+    try:
+        user = await get_user(request.token)
+        if user.role == Role.OWNER:
+            return await search(request.query, -1, request.limit)
+        elif user.role == Role.WORKER:
+            return await search(request.query, user.id, request.limit)
+        else:
+            raise Exception("User has role USER")
+    except Exception as e:
+        logger.debug(f"Token is wrong: {e}")
+        raise HTTPException(status_code=401, detail="Token is invalid")
+
+
+@server.post("/sync")
+async def sync(request: GetSmth, since: Optional[datetime] = None):
+    try:
+        user = await get_user(request.token)
+        if user.role == Role.OWNER:
+            return await get_changes(since, -1, True)
+        elif user.role == Role.WORKER:
+            return await get_changes(since, user.id, False)
+        else:
+            raise Exception("User has role USER")
+    except Exception as e:
+        logger.debug(f"Token is wrong: {e}")
+        raise HTTPException(status_code=401, detail="Token is invalid")
+
+
+@server.post("/job/create")
+async def create_job(request: CreateJob):
+    try:
+        user = await get_user(request.token)
+        if user.role != Role.OWNER:
+            raise Exception("User is not OWNER")
+    except Exception as e:
+        logger.debug(f"Token is wrong: {e}")
+        raise HTTPException(status_code=401, detail="Token is invalid")
+
+    try:
+        return await JobRunner().submit(user.id, request.kind, request.params)
+    except BadFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Job queue is full")
+
+
+@server.post("/job/get/{job_id}")
+async def list_job(request: GetSmth, job_id: int):
+    try:
+        user = await get_user(request.token)
+        if user.role != Role.OWNER:
+            raise Exception("User is not OWNER")
+    except Exception as e:
+        logger.debug(f"Token is wrong: {e}")
+        raise HTTPException(status_code=401, detail="Token is invalid")
+
+    try:
+        return await get_job(job_id)
+    except BadKeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
+@server.post("/job/cancel/{job_id}")
+async def del_job(request: GetSmth, job_id: int):
+    try:
+        user = await get_user(request.token)
+        if user.role != Role.OWNER:
+            raise Exception("User is not OWNER")
+    except Exception as e:
+        logger.debug(f"Token is wrong: {e}")
+        raise HTTPException(status_code=401, detail="Token is invalid")
+
+    try:
+        return await JobRunner().cancel(job_id)
+    except BadKeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
+# Роли, которым доступна операция /batch, как у соответствующих одиночных эндпоинтов
+BATCH_ROLES = {
+    "users": Role.OWNER,
+    "user": Role.OWNER,
+    "objects": Role.OWNER | Role.WORKER,
+    "object": Role.OWNER | Role.WORKER,
+    "tasks": Role.OWNER | Role.WORKER,
+    "task": Role.OWNER | Role.WORKER,
+}
+
+
+async def run_batch_operation(user: User, operation: BatchOperation, session: AsyncSession):
+    """Выполняет одну операцию /batch от имени уже аутентифицированного пользователя."""
+    if not user.role & BATCH_ROLES[operation.op]:
+        raise PermissionError(f"Operation {operation.op} is not allowed")
+    match operation.op:
+        case "users":
+            return await get_users_by_role(Role.WORKER, session=session)
+        case "user":
+            return await get_user(operation.id, False, session=session)
+        case "objects":
+            return await get_factories(session=session)
+        case "object":
+            return await get_factory(operation.id, session=session)
+        case "tasks":
+            user_id = operation.user_id if user.role == Role.OWNER else user.id
+            return await get_tasks(user_id, operation.status, session=session)
+        case "task":
+            return await get_task(operation.id, session=session)
+
+
+@server.post("/batch")
+async def batch(request: Batch):
+    # Аутентификация и все операции выполняются в одной сессии на одном снимке БД
+    async with snapshot_session() as session:
+        try:
+            user = await get_user(request.token, session=session)
+            if user.role == Role.USER:
+                raise Exception("User has role USER")
+        except Exception as e:
+            logger.debug(f"Token is wrong: {e}")
+            raise HTTPException(status_code=401, detail="Token is invalid")
+
+        response = []
+        for operation in request.operations:
+            try:
+                result = await run_batch_operation(user, operation, session)
+            except PermissionError as e:
+                response.append({"status_code": 401, "detail": str(e)})
+            except BadKeyError:
+                response.append({"status_code": 404, "detail": f"{operation.op} not found"})
+            except Exception as e:
+                logger.error(f"Batch operation {operation.op} failed: {e}")
+                response.append({"status_code": 500, "detail": "Internal error"})
+            else:
+                response.append({"status_code": 200, "result": result})
+        return response
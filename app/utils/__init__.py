@@ -1 +1,2 @@
 from .logger import setup_logger
+from .tiles import point_tiles, tile_bounds
@@ -0,0 +1,35 @@
+import math
+
+from app.config.tiles import TILE_MAX_ZOOM
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Границы тайла Web Mercator (slippy map) в градусах.
+
+    Returns:
+        tuple[float, float, float, float]: (west, south, east, north)
+    """
+    n = 2**z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def point_tile(lat: float, lon: float, z: int) -> tuple[int, int]:
+    """Тайл Web Mercator, в который попадает точка на зуме z.
+
+    Returns:
+        tuple[int, int]: (x, y)
+    """
+    n = 2**z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def point_tiles(lat: float, lon: float) -> list[tuple[int, int, int]]:
+    """Все тайлы (z, x, y) с зумами 0..TILE_MAX_ZOOM, содержащие точку."""
+    return [(z, *point_tile(lat, lon, z)) for z in range(TILE_MAX_ZOOM + 1)]
@@ -0,0 +1,112 @@
+"""Бенчмарк масштабирования пропускной способности сервера по числу процессов.
+
+Для каждого значения SERVER_WORKERS запускает `python -m app`, нагружает его keep-alive
+HTTP-запросами из нескольких клиентских процессов и печатает RPS. Для старта сервера
+нужна БД из .env (lifespan вызывает db_init).
+
+Пример:
+    python -m bench.workers --workers 1 2 4 8 --duration 10 --path /favicon.ico
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+
+async def _connection(host: str, port: int, request: bytes, deadline: float) -> int:
+    reader, writer = await asyncio.open_connection(host, port)
+    done = 0
+    try:
+        while time.monotonic() < deadline:
+            writer.write(request)
+            await writer.drain()
+            length = 0
+            while line := await reader.readline():
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            done += 1
+    finally:
+        writer.close()
+    return done
+
+
+def _client(host: str, port: int, path: str, connections: int, duration: float) -> int:
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+    deadline = time.monotonic() + duration
+
+    async def run():
+        counts = await asyncio.gather(
+            *(_connection(host, port, request, deadline) for _ in range(connections))
+        )
+        return sum(counts)
+
+    return asyncio.run(run())
+
+
+def _wait_port(host: str, port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Сервер не поднялся на {host}:{port}")
+
+
+def measure(workers: int, args) -> float:
+    """Запускает сервер с workers процессами и возвращает RPS."""
+    env = os.environ | {"SERVER_WORKERS": str(workers), "SERVER_PORT": str(args.port)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_port("127.0.0.1", args.port)
+        time.sleep(args.warmup)
+        with multiprocessing.Pool(args.clients) as pool:
+            started = time.monotonic()
+            counts = pool.starmap(
+                _client,
+                [("127.0.0.1", args.port, args.path, args.connections, args.duration)]
+                * args.clients,
+            )
+            elapsed = time.monotonic() - started
+        return sum(counts) / elapsed
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--path", default="/favicon.ico")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'rps':>10} {'speedup':>8}")
+    for workers in args.workers:
+        rps = measure(workers, args)
+        baseline = baseline or rps
+        print(f"{workers:>8} {rps:>10.0f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()